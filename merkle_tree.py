@@ -1,48 +1,238 @@
+import ctypes
+import ctypes.util
 import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 from math import ceil, log2
 # import networkx as nx
 # import matplotlib.pyplot as plt
 
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+# Hash constructors selectable through MerkleTree(hash_algo=...). Trees built with
+# anything other than SHA-256 have different roots and are not compatible with
+# Bitcoin/Ethereum-style SHA-256 Merkle proofs.
+_HASH_ALGOS = {'sha256': hashlib.sha256}
+if blake3 is not None:
+    _HASH_ALGOS['blake3'] = blake3.blake3
+
+def _load_hashtree(path=None):
+    """Loads the optional libhashtree batched SHA-256 library, returning None if it is unavailable."""
+    path = path or ctypes.util.find_library('hashtree')
+    if path is None:
+        return None
+    try:
+        lib = ctypes.CDLL(path)
+        lib.hashtree_init.argtypes = [ctypes.c_void_p]
+        lib.hashtree_init.restype = ctypes.c_int
+        lib.hashtree_hash.argtypes = [ctypes.POINTER(ctypes.c_ubyte), ctypes.POINTER(ctypes.c_ubyte), ctypes.c_uint64]
+        lib.hashtree_hash.restype = None
+    except (OSError, AttributeError):
+        # Missing library, or a library of that name without the hashtree symbols
+        return None
+    # Let the library pick its fastest implementation (SHA-NI, AVX-512, AVX2, ...) for this CPU;
+    # it returns 0 when no implementation is supported here
+    if not lib.hashtree_init(None):
+        return None
+    return lib
+
+# Falls back to hashlib.sha256 when libhashtree is not installed
+_hashtree = _load_hashtree()
+
+def _hashtree_pairs(buf, n_pairs):
+    """Hashes n_pairs contiguous 64-byte blocks of a bytearray into a flat bytearray of digests."""
+    # libhashtree's kernels are specialised for exactly 64-byte messages and run the
+    # padding block from a precomputed message schedule, so only internal nodes are
+    # routed here; variable-length leaves always go through hashlib in _hash_data
+    # Hand the level buffer to the multi-buffer kernels without copying it;
+    # ctypes releases the GIL for the duration of the call
+    inp = (ctypes.c_ubyte * (64 * n_pairs)).from_buffer(buf)
+    out = bytearray(32 * n_pairs)
+    _hashtree.hashtree_hash((ctypes.c_ubyte * (32 * n_pairs)).from_buffer(out), inp, n_pairs)
+    return out
+
+# Levels narrower than this are hashed in-process even when parallel hashing is enabled
+_PARALLEL_MIN_PAIRS = 4096
+
+def _hash_chunk(chunk, hash_algo='sha256'):
+    """Hashes a chunk of leaf data items into a flat bytearray of digests."""
+    hasher = _HASH_ALGOS[hash_algo]
+    return bytearray().join([hasher(data.encode('utf-8') if isinstance(data, str) else data).digest() for data in chunk])
+
+def _hash_blocks(buf, hash_algo='sha256'):
+    """Hashes a buffer of contiguous 64-byte blocks into a flat bytearray of digests."""
+    hasher = _HASH_ALGOS[hash_algo]
+    mv = memoryview(buf)
+    return bytearray().join([hasher(mv[i:i + 64]).digest() for i in range(0, len(mv), 64)])
+
+def _map_chunks(executor, func, items, step=1):
+    """Maps func over one chunk of items per CPU and returns the per-chunk results in order."""
+    # Chunk boundaries are rounded to a multiple of step so 64-byte blocks are never split
+    n_chunks = os.cpu_count() or 1
+    size = max(step, -(-len(items) // (n_chunks * step)) * step)
+    return list(executor.map(func, [items[i:i + size] for i in range(0, len(items), size)]))
+
+def _build_levels(leaves_buf, executor=None, hash_algo='sha256'):
+    """Builds every level of the tree from the concatenated 32-byte leaf digests.
+
+    Each level is one flat bytearray of digests, from the leaves up to the root, so
+    the hot loop never creates a Python object per node. When an executor is given,
+    levels with at least _PARALLEL_MIN_PAIRS pairs are hashed across its worker
+    processes unless libhashtree is available (SHA-256 only).
+    """
+    n = len(leaves_buf) // 32
+    # Preallocate one slot per level: the leaves plus one level per halving up to the root
+    height = (n - 1).bit_length() + 1 if n else 1
+    levels = [None] * height
+    levels[0] = current_level = leaves_buf
+
+    # Build the tree level by level until there is only one hash left (the root)
+    for level in range(1, height):
+        # Handle cases where there is an odd number of nodes by duplicating the last node
+        buf = current_level + current_level[-32:] if len(current_level) % 64 else current_level
+        n_pairs = len(buf) // 64
+        if _hashtree is not None and hash_algo == 'sha256':
+            # A single native call hashes every block on the level
+            next_level = _hashtree_pairs(buf, n_pairs)
+        elif executor is not None and n_pairs >= _PARALLEL_MIN_PAIRS:
+            next_level = bytearray().join(_map_chunks(executor, partial(_hash_blocks, hash_algo=hash_algo), buf, step=64))
+        else:
+            next_level = _hash_blocks(buf, hash_algo)
+        levels[level] = current_level = next_level
+
+    return levels
+
+def _build_subtree_levels(leaves_buf, threads):
+    """Builds the tree levels by hashing independent subtrees on a pool of threads.
+
+    Each thread builds the lower levels of one power-of-two-sized slice of the
+    leaves. libhashtree releases the GIL for every level it hashes, so the slices
+    run in parallel. Their levels are then stitched together, and the few levels
+    above the subtree roots are built serially.
+    """
+    n = len(leaves_buf) // 32
+    # Leaves per subtree: a power of two, so subtree levels line up with the full tree's
+    chunk = 1 << (-(-n // threads) - 1).bit_length() if n else 1
+    if chunk >= n:
+        return _build_levels(leaves_buf)
+    sub_height = chunk.bit_length()
+
+    def build_subtree(start):
+        levels = _build_levels(leaves_buf[32 * start:32 * (start + chunk)])
+        # A short final slice reaches its own root early; above that point the full
+        # tree pairs the slice's last node with itself on every level
+        while len(levels) < sub_height:
+            levels.append(_hashtree_pairs(levels[-1] + levels[-1], 1))
+        return levels
+
+    with ThreadPoolExecutor(threads) as executor:
+        subtrees = list(executor.map(build_subtree, range(0, n, chunk)))
+    lower = [leaves_buf] + [bytearray().join(sub[level] for sub in subtrees) for level in range(1, sub_height)]
+    return lower + _build_levels(lower[-1])[1:]
+
+def _abr_level_sizes(n_leaves):
+    """Returns the number of nodes on each level of a tree with n_leaves leaves."""
+    sizes = [n_leaves]
+    while sizes[-1] > 1:
+        sizes.append((sizes[-1] + 1) >> 1)
+    return sizes
+
+def _abr_leaf_count(n_messages):
+    """Returns the smallest leaf count whose tree has a node for each of n_messages in ABR mode."""
+    # Every node holds one message, so a tree with L leaves has room for at least 2L - 1
+    low, high = 1, (n_messages >> 1) + 1
+    while low < high:
+        mid = (low + high) >> 1
+        if sum(_abr_level_sizes(mid)) >= n_messages:
+            high = mid
+        else:
+            low = mid + 1
+    return low if n_messages else 0
+
+# Prefix bytes that keep ABR leaf and internal node hash inputs in separate domains
+_ABR_LEAF = b'\x00'
+_ABR_NODE = b'\x01'
+
+def _abr_message_suffix(message):
+    """Returns the bytes an ABR internal node appends to its children's hashes."""
+    # A marker byte keeps "no message" (None) distinct from the empty message
+    if message is None:
+        return b'\x00'
+    return b'\x01' + (message.encode('utf-8') if isinstance(message, str) else message)
+
 class MerkleTree:
-    def __init__(self, data_list):
-        # Initialize the leaves by hashing each data item
-        self.leaves = [self._hash_data(data) for data in data_list]
-        # Build the Merkle tree from the leaves up to the root
-        self.tree = self._build_tree(self.leaves)
+    def __init__(self, data_list, parallel=False, cached_depth=0, hash_algo='sha256', mode='classic', threads=1):
+        if hash_algo == 'blake3' and blake3 is None:
+            raise ImportError("hash_algo='blake3' requires the blake3 package")
+        if hash_algo not in _HASH_ALGOS:
+            raise ValueError(f"Unsupported hash algorithm: {hash_algo}")
+        if mode not in ('classic', 'abr'):
+            raise ValueError(f"Unsupported tree mode: {mode}")
+        if mode == 'abr' and (parallel or cached_depth or threads > 1):
+            raise ValueError("ABR mode does not support parallel hashing or cached proofs")
+        self.hash_algo = hash_algo
+        self.mode = mode
+        # Subtree threads only pay off with libhashtree, whose calls release the GIL;
+        # hashlib holds it for inputs this small, so they are ignored otherwise
+        self.threads = threads
+        # Bound once per tree so hot loops skip the algorithm lookup
+        self._hasher = _HASH_ALGOS[hash_algo]
+        if mode == 'abr':
+            self.tree = self._build_abr_tree(data_list)
+        elif parallel:
+            # Worker processes only pay off for large trees, so they are opt-in; one pool
+            # is shared by leaf hashing and the wide levels of the tree
+            with ProcessPoolExecutor() as executor:
+                # Chunking needs len() and slicing, so materialize generators and other iterables first
+                leaves = bytearray().join(_map_chunks(executor, partial(_hash_chunk, hash_algo=hash_algo), list(data_list)))
+                self.tree = self._build_tree(leaves, executor)
+        else:
+            # Initialize the leaves by hashing each data item into one flat buffer of 32-byte digests,
+            # encoding text inline rather than dispatching through _hash_data per item
+            leaves = _hash_chunk(data_list, hash_algo)
+            # Build the Merkle tree from the leaves up to the root
+            self.tree = self._build_tree(leaves)
+        # Depth below the root of the level that cached proofs stop at (0 is the root itself)
+        if cached_depth < 0 or cached_depth >= len(self.tree):
+            raise ValueError("Cached depth out of range")
+        self.cached_depth = cached_depth
+
+    @property
+    def leaves(self):
+        """Returns the leaf hashes as a list of raw digests."""
+        return [self._node(0, i) for i in range(self._level_size(0))]
+
+    def _node(self, level, index):
+        """Returns the raw 32-byte digest of a node in a level buffer."""
+        return bytes(self.tree[level][32 * index:32 * index + 32])
+
+    def _level_size(self, level):
+        """Returns the number of nodes stored at a level."""
+        return len(self.tree[level]) // 32
 
     def _hash_data(self, data):
-        """Creates a SHA-256 hash of the input data."""
+        """Creates a digest (32 raw bytes) of the input data with the tree's hash algorithm."""
         if isinstance(data, str):
             data = data.encode('utf-8')
-        return hashlib.sha256(data).hexdigest()
-
-    def _build_tree(self, leaves):
-        """Constructs the Merkle tree and returns the tree as a list of lists."""
-        # Initialize the tree with the leaves at the bottom level
-        tree = [leaves]
-        current_level = leaves
-        
-        # Build the tree level by level until there is only one hash left (the root)
-        while len(current_level) > 1:
-            next_level = []
-            # Iterate over pairs of nodes at the current level
-            for i in range(0, len(current_level), 2):
-                left = current_level[i]
-                # Handle cases where there is an odd number of nodes by duplicating the last node
-                right = current_level[i + 1] if i + 1 < len(current_level) else left
-                # Hash the combination of the left and right nodes to create the parent node
-                combined = left + right
-                next_level.append(self._hash_data(combined))
-            # Add the new level to the tree
-            tree.append(next_level)
-            # Move up to the next level
-            current_level = next_level
+        return self._hasher(data).digest()
 
-        return tree
+    def _build_tree(self, leaves, executor=None):
+        """Constructs the Merkle tree and returns the tree as a list of flat level buffers."""
+        if self.threads > 1 and _hashtree is not None and self.hash_algo == 'sha256':
+            return _build_subtree_levels(leaves, self.threads)
+        return _build_levels(leaves, executor, self.hash_algo)
 
     def get_root(self):
-        """Returns the Merkle root."""
-        return self.tree[-1][0] if self.tree else None
+        """Returns the Merkle root as a hex string."""
+        return self.root_hex() if self.tree[-1] else None
+
+    def root_hex(self):
+        """Returns the hex encoding of the raw Merkle root digest."""
+        return self._node(-1, 0).hex()
 
     def get_tree_height(self):
         """Calculates and returns the height of the tree."""
@@ -52,32 +242,178 @@ class MerkleTree:
         """Prints the tree structure level by level."""
         for level_index, level in enumerate(self.tree):
             print(f"Level {level_index}:")
-            print("  " + "  ".join(level))
+            print("  " + "  ".join(level[i:i + 32].hex() for i in range(0, len(level), 32)))
             print()
 
     def get_proof(self, index):
         """Generates a Merkle proof for a leaf at a given index."""
-        if index < 0 or index >= len(self.leaves):
+        if self.mode == 'abr':
+            return self._get_abr_proof(index)
+        if index < 0 or index >= self._level_size(0):
             raise IndexError("Index out of bounds")
 
-        proof = []
-        for level in range(len(self.tree) - 1):
-            sibling_index = index ^ 1  # XOR with 1 toggles the last bit
-            if sibling_index < len(self.tree[level]):
-                position = 'left' if sibling_index < index else 'right'
-                proof.append({'hash': self.tree[level][sibling_index], 'position': position})
+        # Proofs are packed as (bits, siblings): siblings concatenates one 32-byte hash per
+        # level below the root, and bit k of bits is set when the sibling on level k is
+        # on the left, which is exactly when the node's index on that level is odd
+        bits = 0
+        siblings = [None] * (len(self.tree) - 1)
+        for level in range(len(siblings)):
+            # XOR with 1 toggles the last bit; clamping to the last node pairs the
+            # final node of an odd-sized level with itself
+            start = 32 * min(index ^ 1, self._level_size(level) - 1)
+            siblings[level] = self.tree[level][start:start + 32]
+            bits |= (index & 1) << level
             index //= 2
-        return proof
+        return bits, b''.join(siblings)
+
+    def get_proofs(self, indices):
+        """Generates Merkle proofs for many leaves, checking every index before building any."""
+        indices = list(indices)
+        size = self._abr_message_count if self.mode == 'abr' else self._level_size(0)
+        if any(index < 0 or index >= size for index in indices):
+            raise IndexError("Index out of bounds")
+        return [self.get_proof(index) for index in indices]
+
+    def _fold_proof(self, leaf, proof):
+        """Hashes a leaf up through the siblings of a proof and returns the resulting digest."""
+        hasher = self._hasher
+        bits, siblings = proof
+        # Accept hex-encoded siblings as well as raw digests
+        if isinstance(siblings, str):
+            siblings = bytes.fromhex(siblings)
+        current_hash = self._hash_data(leaf)
+        # Each step is a single 64-byte block; the ctypes call into libhashtree costs
+        # more than hashlib's one-shot digest at that size, so steps stay on hashlib
+        for start in range(0, len(siblings), 32):
+            sibling_hash = siblings[start:start + 32]
+            if bits & 1:
+                current_hash = hasher(sibling_hash + current_hash).digest()
+            else:
+                current_hash = hasher(current_hash + sibling_hash).digest()
+            bits >>= 1
+        return current_hash
 
     def verify_proof(self, leaf, proof, root):
         """Verifies a Merkle proof for a given leaf and root."""
-        current_hash = self._hash_data(leaf)
-        for sibling in proof:
-            if sibling['position'] == 'left':
-                current_hash = self._hash_data(sibling['hash'] + current_hash)
-            elif sibling['position'] == 'right':
-                current_hash = self._hash_data(current_hash + sibling['hash'])
-        return current_hash == root
+        if isinstance(root, str):
+            root = bytes.fromhex(root)
+        if self.mode == 'abr':
+            # A proof of the wrong shape (e.g. a classic (bits, siblings) pair) cannot verify
+            if not isinstance(proof, list) or not all(isinstance(step, dict) for step in proof):
+                return False
+            return self._fold_abr_proof(leaf, proof) == root
+        # Likewise for anything other than a (bits, siblings) pair, such as an ABR proof
+        if not isinstance(proof, tuple) or len(proof) != 2:
+            return False
+        return self._fold_proof(leaf, proof) == root
+
+    def get_proof_cached(self, index):
+        """Generates a Merkle proof that stops at the cached level.
+
+        Returns the proof truncated to the levels below the cached one, together
+        with the index of the leaf's ancestor within the cached level.
+        """
+        if self.mode == 'abr':
+            raise ValueError("ABR mode does not support cached proofs")
+        bits, siblings = self.get_proof(index)
+        steps = len(self.tree) - 1 - self.cached_depth
+        return (bits & ((1 << steps) - 1), siblings[:32 * steps]), index >> steps
+
+    def verify_proof_cached(self, leaf, proof, cached_index):
+        """Verifies a truncated proof from get_proof_cached against the cached level."""
+        if self.mode == 'abr':
+            raise ValueError("ABR mode does not support cached proofs")
+        cached_level = len(self.tree) - 1 - self.cached_depth
+        if cached_index < 0 or cached_index >= self._level_size(cached_level):
+            return False
+        if not isinstance(proof, tuple) or len(proof) != 2:
+            return False
+        return self._fold_proof(leaf, proof) == self._node(cached_level, cached_index)
+
+    def _build_abr_tree(self, data_list):
+        """Constructs an ABR-style tree where every internal node also absorbs one message.
+
+        The first messages are hashed as leaves (0x00 || message); the rest are attached
+        to the internal nodes level by level, and each parent is hashed as
+        0x01 || left || right || 0x01 || message, or 0x01 || left || right || 0x00 once
+        the messages run out. The prefix byte keeps a leaf message from posing as an
+        internal node, and the suffix marker keeps an empty message from posing as a
+        node that absorbed nothing.
+        A tree of the same height therefore authenticates about twice as many messages
+        with one hash call per message. Roots and proofs are not compatible with the
+        classic mode.
+        """
+        messages = [data.encode('utf-8') if isinstance(data, str) else data for data in data_list]
+        n_leaves = _abr_leaf_count(len(messages))
+        hasher = self._hasher
+        tree = [bytearray().join([hasher(_ABR_LEAF + message).digest() for message in messages[:n_leaves]])]
+        # Per level, the message absorbed by each node (None once the messages run out)
+        self._abr_messages = [None]
+        remaining = messages[n_leaves:]
+        for size in _abr_level_sizes(n_leaves)[1:]:
+            level_messages, remaining = remaining[:size], remaining[size:]
+            level_messages += [None] * (size - len(level_messages))
+            current_level = tree[-1]
+            buf = current_level + current_level[-32:] if len(current_level) % 64 else current_level
+            next_level = bytearray(32 * size)
+            for i in range(size):
+                node = hasher(_ABR_NODE)
+                node.update(buf[64 * i:64 * i + 64])
+                node.update(_abr_message_suffix(level_messages[i]))
+                next_level[32 * i:32 * i + 32] = node.digest()
+            tree.append(next_level)
+            self._abr_messages.append(level_messages)
+        self._abr_message_count = len(messages)
+        return tree
+
+    def _get_abr_proof(self, index):
+        """Generates an ABR-mode proof for the message at a given index.
+
+        Each step carries the sibling hash, its position and the message absorbed by
+        the parent. Messages stored at an internal node start with a step holding the
+        hashes of that node's two children.
+        """
+        if index < 0 or index >= self._abr_message_count:
+            raise IndexError("Index out of bounds")
+
+        # Locate the node that holds the message: leaves first, then each internal level in turn
+        level, position = 0, index
+        while position >= self._level_size(level):
+            position -= self._level_size(level)
+            level += 1
+
+        proof = []
+        if level:
+            left = 2 * position
+            right = min(left + 1, self._level_size(level - 1) - 1)
+            proof.append({'left': self._node(level - 1, left), 'right': self._node(level - 1, right)})
+        for level in range(level, len(self.tree) - 1):
+            sibling_index = min(position ^ 1, self._level_size(level) - 1)
+            side = 'left' if sibling_index < position else 'right'
+            position //= 2
+            proof.append({'hash': self._node(level, sibling_index), 'position': side,
+                          'message': self._abr_messages[level + 1][position]})
+        return proof
+
+    def _fold_abr_proof(self, data, proof):
+        """Hashes a message up through an ABR-mode proof and returns the resulting digest."""
+        hasher = self._hasher
+        message = data.encode('utf-8') if isinstance(data, str) else data
+        if proof and 'left' in proof[0]:
+            current_hash = hasher(_ABR_NODE + proof[0]['left'] + proof[0]['right'] + _abr_message_suffix(message)).digest()
+            proof = proof[1:]
+        else:
+            current_hash = hasher(_ABR_LEAF + message).digest()
+        for step in proof:
+            suffix = _abr_message_suffix(step['message'])
+            if step['position'] == 'left':
+                current_hash = hasher(_ABR_NODE + step['hash'] + current_hash + suffix).digest()
+            elif step['position'] == 'right':
+                current_hash = hasher(_ABR_NODE + current_hash + step['hash'] + suffix).digest()
+            else:
+                # A step without a valid position cannot be folded, so the proof never matches
+                return None
+        return current_hash
 
 if __name__ == "__main__":
     # Example data to create the Merkle tree
@@ -87,8 +423,8 @@ if __name__ == "__main__":
     merkle_tree = MerkleTree(data)
     
     # Print the Merkle tree structure, the root hash, the tree height, and visualize the tree
-    print("Merkle Tree Levels:", merkle_tree.tree)
-    print("\nMerkle Tree Leaves:", merkle_tree.leaves)
+    print("Merkle Tree Levels:", [[level[i:i + 32].hex() for i in range(0, len(level), 32)] for level in merkle_tree.tree])
+    print("\nMerkle Tree Leaves:", [leaf.hex() for leaf in merkle_tree.leaves])
     print("\nMerkle Root:", merkle_tree.get_root())
     print("\nTree Height:", merkle_tree.get_tree_height())
     print("\nVisualized Tree:")
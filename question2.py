@@ -4,45 +4,68 @@ from math import ceil, log2
 # import matplotlib.pyplot as plt
 
 class MerkleTree:
+    # Bound once at class level so hot loops skip the hashlib module lookup
+    _sha256 = staticmethod(hashlib.sha256)
+
     def __init__(self, data_list):
-        # Initialize the leaves by hashing each data item
-        self.leaves = [self._hash_data(data) for data in data_list]
+        # Initialize the leaves by hashing each data item into one flat buffer of 32-byte digests
+        leaves = bytearray().join([self._hash_data(data) for data in data_list])
         # Build the Merkle tree from the leaves up to the root
-        self.tree = self._build_tree(self.leaves)
+        self.tree = self._build_tree(leaves)
+
+    @property
+    def leaves(self):
+        """Returns the leaf hashes as a list of raw digests."""
+        return [self._node(0, i) for i in range(self._level_size(0))]
+
+    def _node(self, level, index):
+        """Returns the raw 32-byte digest of a node in a level buffer."""
+        return bytes(self.tree[level][32 * index:32 * index + 32])
+
+    def _level_size(self, level):
+        """Returns the number of nodes stored at a level."""
+        return len(self.tree[level]) // 32
 
     def _hash_data(self, data):
-        """Creates a SHA-256 hash of the input data."""
+        """Creates a SHA-256 digest (32 raw bytes) of the input data."""
         if isinstance(data, str):
             data = data.encode('utf-8')
-        return hashlib.sha256(data).hexdigest()
+        return self._sha256(data).digest()
 
     def _build_tree(self, leaves):
-        """Constructs the Merkle tree and returns the tree as a list of lists."""
+        """Constructs the Merkle tree and returns the tree as a list of flat level buffers."""
+        n = len(leaves) // 32
+        # Preallocate one slot per level: the leaves plus one level per halving up to the root
+        height = (n - 1).bit_length() + 1 if n else 1
+        tree = [None] * height
         # Initialize the tree with the leaves at the bottom level
-        tree = [leaves]
+        tree[0] = leaves
         current_level = leaves
-        
+        sha256 = self._sha256
+
         # Build the tree level by level until there is only one hash left (the root)
-        while len(current_level) > 1:
-            next_level = []
-            # Iterate over pairs of nodes at the current level
-            for i in range(0, len(current_level), 2):
-                left = current_level[i]
-                # Handle cases where there is an odd number of nodes by duplicating the last node
-                right = current_level[i + 1] if i + 1 < len(current_level) else left
-                # Hash the combination of the left and right nodes to create the parent node
-                combined = left + right
-                next_level.append(self._hash_data(combined))
+        for level in range(1, height):
+            # Each level is already a run of 64-byte (left, right) blocks; on an odd
+            # number of nodes, duplicate the last node to complete the final block
+            buf = current_level + current_level[-32:] if len(current_level) % 64 else current_level
+            mv = memoryview(buf)
+            # Hash each 64-byte block to create the parent nodes; the padding above
+            # means the loop needs no per-pair boundary check
+            next_level = bytearray().join([sha256(mv[i:i + 64]).digest() for i in range(0, len(mv), 64)])
             # Add the new level to the tree
-            tree.append(next_level)
+            tree[level] = next_level
             # Move up to the next level
             current_level = next_level
 
         return tree
 
     def get_root(self):
-        """Returns the Merkle root."""
-        return self.tree[-1][0] if self.tree else None
+        """Returns the Merkle root as a hex string."""
+        return self.root_hex() if self.tree[-1] else None
+
+    def root_hex(self):
+        """Returns the hex encoding of the raw Merkle root digest."""
+        return self._node(-1, 0).hex()
 
     def get_tree_height(self):
         """Calculates and returns the height of the tree."""
@@ -52,47 +75,61 @@ class MerkleTree:
         """Prints the tree structure level by level."""
         for level_index, level in enumerate(self.tree):
             print(f"Level {level_index}:")
-            print("  " + "  ".join(level))
+            print("  " + "  ".join(level[i:i + 32].hex() for i in range(0, len(level), 32)))
             print()
 
     def get_proof(self, index):
         """Generates a Merkle proof for a leaf at a given index."""
-        if index < 0 or index >= len(self.leaves):
+        if index < 0 or index >= self._level_size(0):
             raise IndexError("Index out of bounds")
 
-        proof = []
-        for level in range(len(self.tree) - 1):
-            sibling_index = index ^ 1  # XOR with 1 toggles the last bit
-            if sibling_index < len(self.tree[level]):
-                position = 'left' if sibling_index < index else 'right'
-                proof.append({'hash': self.tree[level][sibling_index], 'position': position})
+        # Proofs are packed as (bits, siblings): siblings concatenates one 32-byte hash per
+        # level below the root, and bit k of bits is set when the sibling on level k is
+        # on the left, which is exactly when the node's index on that level is odd
+        bits = 0
+        siblings = [None] * (len(self.tree) - 1)
+        for level in range(len(siblings)):
+            # XOR with 1 toggles the last bit; clamping to the last node pairs the
+            # final node of an odd-sized level with itself
+            start = 32 * min(index ^ 1, self._level_size(level) - 1)
+            siblings[level] = self.tree[level][start:start + 32]
+            bits |= (index & 1) << level
             index //= 2
-        return proof
+        return bits, b''.join(siblings)
 
     def verify_proof(self, leaf, proof, root):
         """Verifies a Merkle proof for a given leaf and root."""
+        sha256 = self._sha256
+        bits, siblings = proof
+        # Accept hex-encoded siblings as well as raw digests
+        if isinstance(siblings, str):
+            siblings = bytes.fromhex(siblings)
         current_hash = self._hash_data(leaf)
-        for sibling in proof:
-            if sibling['position'] == 'left':
-                current_hash = self._hash_data(sibling['hash'] + current_hash)
-            elif sibling['position'] == 'right':
-                current_hash = self._hash_data(current_hash + sibling['hash'])
+        for start in range(0, len(siblings), 32):
+            sibling_hash = siblings[start:start + 32]
+            if bits & 1:
+                current_hash = sha256(sibling_hash + current_hash).digest()
+            else:
+                current_hash = sha256(current_hash + sibling_hash).digest()
+            bits >>= 1
+        if isinstance(root, str):
+            root = bytes.fromhex(root)
         return current_hash == root
     
     def find_sibling(self, index):
-        """Returns the sibling hash of a given leaf node index."""
-        if index < 0 or index >= len(self.leaves):
+        """Returns the hex sibling hash of a given leaf node index."""
+        if index < 0 or index >= self._level_size(0):
             raise IndexError("Index out of bounds")
 
         # Sibling index is calculated by toggling the last bit (XOR with 1)
         sibling_index = index ^ 1
 
         # Ensure sibling_index is within bounds for the first level (leaves level)
-        if sibling_index >= len(self.tree[0]):
+        if sibling_index >= self._level_size(0):
             return None
 
         # Return the sibling hash from the first level (leaves level)
-        return self.tree[0][sibling_index]
+        return self._node(0, sibling_index).hex()
         
 if __name__ == "__main__":
     # Example data to create the Merkle tree
@@ -1,41 +1,66 @@
 import hashlib
 import json
 
+# json.dumps builds a new encoder on every call once any option is passed, so one
+# shared sort_keys encoder is reused; it emits exactly json.dumps(data, sort_keys=True)
+_json_encode = json.JSONEncoder(sort_keys=True).encode
+
 class MerkleTree:
+    # Bound once at class level so hot loops skip the hashlib module lookup
+    _sha256 = staticmethod(hashlib.sha256)
+
     def __init__(self, data_list):
-        # Initialize the Merkle tree by hashing the given data and building the tree
-        self.leaves = [self._hash_data(data) for data in data_list]
-        self.tree = self._build_tree(self.leaves)
+        # Initialize the Merkle tree by hashing the given data into one flat buffer and building the tree
+        leaves = bytearray().join([self._hash_data(data) for data in data_list])
+        self.tree = self._build_tree(leaves)
+
+    @property
+    def leaves(self):
+        """Returns the leaf hashes as a list of raw digests."""
+        return [self._node(0, i) for i in range(self._level_size(0))]
+
+    def _node(self, level, index):
+        """Returns the raw 32-byte digest of a node in a level buffer."""
+        return bytes(self.tree[level][32 * index:32 * index + 32])
+
+    def _level_size(self, level):
+        """Returns the number of nodes stored at a level."""
+        return len(self.tree[level]) // 32
 
     def _hash_data(self, data):
-        """Creates a SHA-256 hash of the input data, handling both strings and dictionaries."""
-        # If the data is a dictionary, convert it to a JSON string
-        if isinstance(data, dict):
-            data = json.dumps(data, sort_keys=True).encode('utf-8')
-        elif isinstance(data, str):
-            data = data.encode('utf-8')
-        return hashlib.sha256(data).hexdigest()
+        """Creates a SHA-256 digest (32 raw bytes) of the input data, handling bytes, strings and dictionaries."""
+        # Raw bytes need no conversion, so they are checked first; any other value
+        # (such as a dictionary) is hashed through its canonical JSON encoding
+        if not isinstance(data, (bytes, bytearray)):
+            data = data.encode('utf-8') if isinstance(data, str) else _json_encode(data).encode('utf-8')
+        return self._sha256(data).digest()
 
     def _build_tree(self, leaves):
-        """Constructs the Merkle tree and returns the tree as a list of lists."""
-        tree = [leaves]
+        """Constructs the Merkle tree and returns the tree as a list of flat level buffers."""
+        n = len(leaves) // 32
+        height = (n - 1).bit_length() + 1 if n else 1
+        tree = [None] * height
+        tree[0] = leaves
         current_level = leaves
-        
-        while len(current_level) > 1:
-            next_level = []
-            for i in range(0, len(current_level), 2):
-                left = current_level[i]
-                right = current_level[i + 1] if i + 1 < len(current_level) else left
-                combined = left + right
-                next_level.append(self._hash_data(combined))
-            tree.append(next_level)
+        sha256 = self._sha256
+
+        for level in range(1, height):
+            # The level is a run of 64-byte blocks; duplicate the last node on odd counts
+            buf = current_level + current_level[-32:] if len(current_level) % 64 else current_level
+            mv = memoryview(buf)
+            next_level = bytearray().join([sha256(mv[i:i + 64]).digest() for i in range(0, len(mv), 64)])
+            tree[level] = next_level
             current_level = next_level
 
         return tree
 
     def get_root(self):
-        """Returns the Merkle root."""
-        return self.tree[-1][0] if self.tree else None
+        """Returns the Merkle root as a hex string."""
+        return self.root_hex() if self.tree[-1] else None
+
+    def root_hex(self):
+        """Returns the hex encoding of the raw Merkle root digest."""
+        return self._node(-1, 0).hex()
 
     def get_tree_height(self):
         """Calculates and returns the height of the tree."""
@@ -45,32 +70,49 @@ class MerkleTree:
         """Prints the tree structure level by level with hash truncation."""
         for level_index, level in enumerate(self.tree):
             print(f"Level {level_index}:")
-            truncated_hashes = [hash[:6] for hash in level]
+            truncated_hashes = [level[i:i + 3].hex() for i in range(0, len(level), 32)]
             print("  " + "  ".join(truncated_hashes))
             print()
 
     def get_proof(self, index):
         """Generates a Merkle proof for a leaf at a given index."""
-        if index < 0 or index >= len(self.leaves):
+        if index < 0 or index >= self._level_size(0):
             raise IndexError("Index out of bounds")
 
-        proof = []
-        for level in range(len(self.tree) - 1):
-            sibling_index = index ^ 1  # XOR with 1 toggles the last bit
-            if sibling_index < len(self.tree[level]):
-                position = 'left' if sibling_index < index else 'right'
-                proof.append({'hash': self.tree[level][sibling_index], 'position': position})
+        # Proofs are packed as (bits, siblings): siblings concatenates one 32-byte hash per
+        # level below the root, and bit k of bits is set when the sibling on level k is
+        # on the left, which is exactly when the node's index on that level is odd
+        bits = 0
+        siblings = [None] * (len(self.tree) - 1)
+        for level in range(len(siblings)):
+            # XOR with 1 toggles the last bit; clamping to the last node pairs the
+            # final node of an odd-sized level with itself
+            start = 32 * min(index ^ 1, self._level_size(level) - 1)
+            siblings[level] = self.tree[level][start:start + 32]
+            bits |= (index & 1) << level
             index //= 2
-        return proof
+        return bits, b''.join(siblings)
 
     def verify_proof(self, leaf, proof, root):
         """Verifies a Merkle proof for a given leaf and root."""
+        # Anything other than a (bits, siblings) pair, such as an old list of steps, cannot verify
+        if not isinstance(proof, tuple) or len(proof) != 2:
+            return False
+        sha256 = self._sha256
+        bits, siblings = proof
+        # Accept hex-encoded siblings as well as raw digests
+        if isinstance(siblings, str):
+            siblings = bytes.fromhex(siblings)
         current_hash = self._hash_data(leaf)
-        for sibling in proof:
-            if sibling['position'] == 'left':
-                current_hash = self._hash_data(sibling['hash'] + current_hash)
-            elif sibling['position'] == 'right':
-                current_hash = self._hash_data(current_hash + sibling['hash'])
+        for start in range(0, len(siblings), 32):
+            sibling_hash = siblings[start:start + 32]
+            if bits & 1:
+                current_hash = sha256(sibling_hash + current_hash).digest()
+            else:
+                current_hash = sha256(current_hash + sibling_hash).digest()
+            bits >>= 1
+        if isinstance(root, str):
+            root = bytes.fromhex(root)
         return current_hash == root
 
     def test_immutability(self, index, new_value):
@@ -83,15 +125,24 @@ class MerkleTree:
         print("Roots match after modification:", original_root == updated_root)
 
     def update_leaf(self, index, new_value):
-        """Update a leaf node and rebuild the tree from that node upwards."""
-        if index < 0 or index >= len(self.leaves):
+        """Update a leaf node and recompute only the hashes on its path to the root."""
+        if index < 0 or index >= self._level_size(0):
             raise IndexError("Index out of bounds")
         
-        # Update the leaf node
-        self.leaves[index] = self._hash_data(new_value)
+        # Update the leaf node in place in the bottom level buffer
+        self.tree[0][32 * index:32 * index + 32] = self._hash_data(new_value)
         
-        # Rebuild the tree from the leaf upwards
-        self.tree = self._build_tree(self.leaves)
+        # Rehash the ancestors of the leaf from that node upwards
+        sha256 = self._sha256
+        for level in range(len(self.tree) - 1):
+            # The (left, right) pair is the 64-byte block starting at the even node
+            start = 32 * (index & ~1)
+            block = self.tree[level][start:start + 64]
+            # The last node of an odd-sized level is paired with itself
+            if len(block) == 32:
+                block *= 2
+            index //= 2
+            self.tree[level + 1][32 * index:32 * index + 32] = sha256(block).digest()
 
 # Example usage
 if __name__ == "__main__":